@@ -1,13 +1,22 @@
 """
 Conducttr Eagle API — Streamlit Publish App
 Usage:
-    pip install streamlit requests
+    pip install streamlit requests orjson
     streamlit run conducttr_app.py
 """
 
-import io, json, os, re, time, zipfile
+import http.cookiejar, json, os, re, shutil, tempfile, threading, time, zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # ── Page config ───────────────────────────────────────────────────────────────
 
@@ -21,6 +30,56 @@ st.set_page_config(
 
 API_BASE = "https://dev-api.conducttr.com/v1.1/eagle"
 
+PUBLISH_WORKERS         = 8    # concurrent POST /messages requests
+PUBLISH_INTERVAL        = 0.2  # seconds between request starts, to pace the API
+ZIP_SPOOL_MAX_SIZE      = 16 * 1024 * 1024  # persona ZIPs above this spill to disk
+
+# POST /messages/bulk is not a confirmed part of the Eagle API, so it is opt-in
+# (CONDUCTTR_BULK_PUBLISH=1) until the request/response contract is known
+BULK_PUBLISH_ENABLED = os.environ.get("CONDUCTTR_BULK_PUBLISH") == "1"
+# Bulk statuses meaning "route doesn't exist"; only these fall back to per-team
+BULK_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+_PREFIX_RE      = re.compile(r"^[A-Z] - ")
+_DATE_SUFFIX_RE = re.compile(r" - \d{4}[\/-]\d{2}[\/-]\d{2}.*$")
+
+# ── HTTP sessions ──────────────────────────────────────────────────────────────
+
+def _make_session() -> requests.Session:
+    """Session with pooled keep-alive connections and retries on gateway errors.
+
+    Cookies are deliberately never stored: the session is shared by every user
+    and API key in the process, so only the connection pool may carry over.
+    """
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    session.mount("https://", HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=50,
+        # raise_on_status=False hands the last 5xx back to raise_for_status()
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                          raise_on_status=False),
+    ))
+    return session
+
+
+@st.cache_resource
+def _get_session() -> requests.Session:
+    """Eagle API session, shared (pool only, no cookies) by every rerun and user
+    in this process."""
+    return _make_session()
+
+
+@st.cache_resource
+def _get_s3_session() -> requests.Session:
+    """Separate session for presigned S3 downloads, so connections to the
+    other host never carry our auth headers."""
+    return _make_session()
+
+# Resolved on the script thread each run; the publish worker threads read these
+_SESSION    = _get_session()
+_S3_SESSION = _get_s3_session()
+
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
 def make_headers(api_key: str) -> dict:
@@ -36,27 +95,109 @@ def clean_team_name(raw_name: str) -> str:
         return "Session"
     if raw_name.startswith("M - "):
         return "Moderators"
+    # Both patterns need a " - " separator; skip the regexes when there is none
+    if " - " not in raw_name:
+        return raw_name.strip()
     # All other prefixes (e.g. T -): strip prefix, then strip trailing date/timestamp
-    name = re.sub(r"^[A-Z] - ", "", raw_name)
-    name = re.sub(r" - \d{4}[\/-]\d{2}[\/-]\d{2}.*$", "", name)
+    name = _PREFIX_RE.sub("", raw_name)
+    if " - " in name:
+        name = _DATE_SUFFIX_RE.sub("", name)
     return name.strip()
 
+
+def build_persona_options(orgs: list[dict]) -> tuple[tuple[str, ...], dict]:
+    """Return (labels, {label: persona}) in a single pass over `orgs`.
+    Duplicate labels collapse to one entry, as with a plain dict comprehension.
+    """
+    mapping = {}
+    for p in orgs:
+        si = p.get("system_info") or {}
+        mapping[f"{si.get('name', 'Unknown')}  (@{si.get('handle', '?')})"] = p
+    return tuple(mapping), mapping
+
+
+def build_team_options(teams: list[dict], team_name_by_id: dict) -> tuple[tuple[str, ...], dict]:
+    """Return (labels, {label: team}) in a single pass over `teams`."""
+    mapping = {f"{team_name_by_id[t['team_id']]}  (id: {t['team_id']})": t for t in teams}
+    return tuple(mapping), mapping
+
 # ── Cached API calls ───────────────────────────────────────────────────────────
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_resource
+def _get_etag_cache() -> dict:
+    """Process-wide {endpoint: (owner, etag, parsed_value)} for conditional GETs.
+
+    Only the most recent response per endpoint is kept, so memory stays bounded
+    no matter how many API keys connect. `owner` is a tuple starting with the
+    API key, and an entry is only reused by the same owner.
+    Held in cache_resource because Streamlit re-executes this module on every
+    rerun, which would reset a plain module-level dict.
+    """
+    return {}
+
+
+def _clear_etag_cache(api_key: str) -> None:
+    """Drop the entries owned by `api_key`, leaving other sessions' entries."""
+    etag_cache = _get_etag_cache()
+    for endpoint, (owner, _, _) in list(etag_cache.items()):
+        if owner[0] == api_key:
+            etag_cache.pop(endpoint, None)
+
+
+def _conditional_get(session: requests.Session, url: str, endpoint: str, owner: tuple, parse, **kwargs):
+    """GET `url` with If-None-Match; reuse the previous parsed value on HTTP 304."""
+    etag_cache = _get_etag_cache()
+    cached = etag_cache.get(endpoint)
+    if cached and cached[0] != owner:
+        cached = None
+    headers = dict(kwargs.pop("headers", None) or {})
+    if cached:
+        headers["If-None-Match"] = cached[1]
+
+    with session.get(url, headers=headers, **kwargs) as res:
+        if res.status_code == 304 and cached:
+            return cached[2]
+        res.raise_for_status()
+        value = parse(res)
+        etag = res.headers.get("ETag")
+
+    if etag:
+        etag_cache[endpoint] = (owner, etag, value)
+    return value
+
+
+def _parse_persona_zip(zip_res: requests.Response):
+    # Stream the ZIP into a spooled file: small exports stay in memory, large
+    # ones spill to disk instead of being held as one big bytes object.
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE) as buf:
+        zip_res.raw.decode_content = True
+        shutil.copyfileobj(zip_res.raw, buf)
+        buf.seek(0)
+
+        with zipfile.ZipFile(buf) as z:
+            json_filename = next((zi.filename for zi in z.infolist() if zi.filename.endswith(".json")), None)
+            if json_filename is None:
+                raise RuntimeError("No JSON file found in persona ZIP.")
+            with z.open(json_filename) as fp:
+                return _json_loads(fp.read())
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_personas(api_key: str) -> list[dict]:
-    """Fetch all personas; cached for 5 minutes."""
+    """Fetch all personas; cached for 1 hour, revalidated with ETags."""
     headers = make_headers(api_key)
-    res = requests.get(f"{API_BASE}/personas", headers=headers)
+    res = _SESSION.get(f"{API_BASE}/personas", headers=headers)
     res.raise_for_status()
     presigned_url = res.json()["presigned_url"]
 
-    zip_res = requests.get(presigned_url)
-    zip_res.raise_for_status()
-
-    with zipfile.ZipFile(io.BytesIO(zip_res.content)) as z:
-        json_filename = next(n for n in z.namelist() if n.endswith(".json"))
-        data = json.loads(z.read(json_filename))
+    # Presigned query strings change per request, so key on the object path
+    data = _conditional_get(
+        _S3_SESSION, presigned_url,
+        endpoint="personas",
+        owner=(api_key, presigned_url.split("?", 1)[0]),
+        parse=_parse_persona_zip,
+        stream=True,
+    )
 
     if isinstance(data, list):
         return data
@@ -67,27 +208,83 @@ def fetch_personas(api_key: str) -> list[dict]:
     return []
 
 
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_teams(api_key: str) -> list[dict]:
-    """Fetch all teams; cached for 5 minutes.
+    """Fetch all teams; cached for 1 hour, revalidated with ETags.
     Response is always a bare JSON array with 'id' and 'name' fields.
     """
-    headers = make_headers(api_key)
-    res = requests.get(f"{API_BASE}/teams", headers=headers)
-    res.raise_for_status()
-    return [{"team_id": t["id"], "name": t["name"]} for t in res.json()]
+    return _conditional_get(
+        _SESSION, f"{API_BASE}/teams",
+        endpoint="teams",
+        owner=(api_key,),
+        parse=lambda res: [{"team_id": t["id"], "name": t["name"]} for t in _json_loads(res.content)],
+        headers=make_headers(api_key),
+    )
+
+
+def clear_results():
+    st.session_state.pop("last_results", None)
+    st.session_state.pop("last_results_teams", None)
+
+
+def _publish_result(res: requests.Response) -> dict:
+    if res.ok:
+        return {"ok": True, "status": res.status_code}
+    # Decode only the bytes we show, not the whole (possibly huge) error page
+    snippet = res.content[:300].decode("utf-8", "replace")
+    return {"ok": False, "status": res.status_code, "error": snippet}
 
 
 def publish_to_team(api_key: str, payload: dict) -> dict:
     """POST a single message. Returns result dict."""
     try:
-        res = requests.post(f"{API_BASE}/messages", headers=make_headers(api_key), json=payload)
-        if res.ok:
-            return {"ok": True, "status": res.status_code}
-        return {"ok": False, "status": res.status_code, "error": res.text[:300]}
+        res = _SESSION.post(f"{API_BASE}/messages", headers=make_headers(api_key), json=payload)
+        return _publish_result(res)
     except requests.RequestException as e:
         return {"ok": False, "status": 0, "error": str(e)}
 
+
+def publish_to_team_at(api_key: str, payload: dict, start_at: float, cancelled: threading.Event) -> dict:
+    """Wait until `start_at` (time.monotonic()), then publish_to_team().
+    Skips the POST if `cancelled` is set while waiting.
+    """
+    if cancelled.wait(max(0.0, start_at - time.monotonic())):
+        return {"ok": False, "status": 0, "error": "cancelled"}
+    return publish_to_team(api_key, payload)
+
+
+@st.cache_resource
+def _bulk_publish_support() -> dict:
+    """Remembers whether POST /messages/bulk works, so we only probe it once."""
+    return {"supported": None}
+
+
+def publish_bulk(api_key: str, payloads: list[dict]) -> dict | None:
+    """POST all messages in one request. Returns a result dict shared by every
+    message, or None to publish per team instead.
+    """
+    support = _bulk_publish_support()
+    if not BULK_PUBLISH_ENABLED or support["supported"] is False:
+        return None
+    try:
+        res = _SESSION.post(
+            f"{API_BASE}/messages/bulk",
+            headers=make_headers(api_key),
+            json={"messages": payloads},
+        )
+    except requests.RequestException as e:
+        # The messages may or may not have gone out; don't risk posting twice
+        return {"ok": False, "status": 0, "error": str(e)}
+    if res.status_code in BULK_UNSUPPORTED_STATUSES:
+        # No such route, so nothing was stored; safe to publish per team
+        support["supported"] = False
+        return None
+    if res.ok:
+        support["supported"] = True
+    # Any other error (e.g. a 5xx or gateway timeout) may have stored some of
+    # the messages, so report it rather than re-posting them one by one
+    return _publish_result(res)
+
 # ── UI ─────────────────────────────────────────────────────────────────────────
 
 st.title("📡 Conducttr Publisher")
@@ -111,10 +308,20 @@ with st.expander("🔑 API Key", expanded="api_key" not in st.session_state):
                 try:
                     personas_raw = fetch_personas(api_key_input.strip())
                     teams_raw    = fetch_teams(api_key_input.strip())
-                    orgs = [p for p in personas_raw if p.get("system_info", {}).get("is_organisation")]
+                    orgs = [p for p in personas_raw if (p.get("system_info") or {}).get("is_organisation")]
+                    team_name_by_id = {t["team_id"]: clean_team_name(t["name"]) for t in teams_raw}
                     st.session_state["api_key"] = api_key_input.strip()
                     st.session_state["orgs"]    = orgs
                     st.session_state["teams"]   = teams_raw
+                    # Built once here rather than on every rerun of the script
+                    st.session_state["team_name_by_id"] = team_name_by_id
+                    (st.session_state["persona_option_labels"],
+                     st.session_state["persona_options"]) = build_persona_options(orgs)
+                    (st.session_state["team_option_labels"],
+                     st.session_state["team_options"]) = build_team_options(teams_raw, team_name_by_id)
+                    # Selected labels may not exist in the new team list
+                    st.session_state.pop("team_multiselect", None)
+                    clear_results()
                     st.success(f"Connected — {len(orgs)} persona(s), {len(teams_raw)} team(s) loaded.")
                     st.rerun()
                 except requests.HTTPError as e:
@@ -132,6 +339,12 @@ api_key = st.session_state["api_key"]
 orgs    = st.session_state["orgs"]
 teams   = st.session_state["teams"]
 
+team_name_by_id = st.session_state["team_name_by_id"]
+persona_options = st.session_state["persona_options"]
+team_options    = st.session_state["team_options"]
+persona_option_labels = st.session_state["persona_option_labels"]
+team_option_labels    = st.session_state["team_option_labels"]
+
 if not orgs:
     st.error("No organisation personas found. Cannot publish.")
     st.stop()
@@ -145,14 +358,10 @@ if not teams:
 st.divider()
 st.subheader("1 · Choose a Persona")
 
-persona_options = {
-    f"{p.get('system_info', {}).get('name', 'Unknown')}  (@{p.get('system_info', {}).get('handle', '?')})": p
-    for p in orgs
-}
 chosen_persona_label = st.selectbox(
     "Publish as",
-    options=list(persona_options.keys()),
-    help="Organisation personas only. Persona list refreshes every 5 minutes.",
+    options=persona_option_labels,
+    help="Organisation personas only. Use 🔄 Refresh data to reload the list.",
 )
 chosen_persona = persona_options[chosen_persona_label]
 
@@ -161,27 +370,22 @@ chosen_persona = persona_options[chosen_persona_label]
 st.divider()
 st.subheader("2 · Choose Team(s)")
 
-team_options = {
-    f"{clean_team_name(t['name'])}  (id: {t['team_id']})": t
-    for t in teams
-}
 chosen_team_labels = st.multiselect(
     "Publish to",
-    options=list(team_options.keys()),
+    options=team_option_labels,
     placeholder="Select one or more teams…",
-    help="Hold Ctrl / Cmd to select multiple. Team list refreshes every 5 minutes.",
+    help="Hold Ctrl / Cmd to select multiple. Use 🔄 Refresh data to reload the list.",
+    key="team_multiselect",
 )
 
+def select_all_teams():
+    # Runs as a callback, before the rerun the click triggers, so the
+    # multiselect picks up the full selection without a second st.rerun()
+    st.session_state["team_multiselect"] = list(team_option_labels)
+
 col_all, col_clear = st.columns([1, 5])
 with col_all:
-    if st.button("Select all"):
-        # Trigger a rerun with all teams pre-selected via query param workaround
-        st.session_state["select_all_teams"] = True
-        st.rerun()
-
-# Handle "select all" on rerun
-if st.session_state.pop("select_all_teams", False):
-    chosen_team_labels = list(team_options.keys())
+    st.button("Select all", on_click=select_all_teams)
 
 chosen_teams = [team_options[label] for label in chosen_team_labels]
 
@@ -197,7 +401,6 @@ body_raw = st.text_area(
     height=200,
     placeholder="Paste plain text or HTML. Plain text will be wrapped in <p> tags automatically.",
 )
-body = body_raw.strip() if "<" in body_raw else f"<p>{body_raw.strip()}</p>"
 
 col_sent, col_draft = st.columns(2)
 with col_sent:
@@ -223,8 +426,9 @@ if not chosen_teams:
 if ready:
     with st.expander("📋 Review before publishing", expanded=True):
         st.markdown(f"**Persona:** {chosen_persona_label}")
-        st.markdown(f"**Teams:** {', '.join(clean_team_name(t['name']) for t in chosen_teams)}")
+        st.markdown(f"**Teams:** {', '.join(team_name_by_id[t['team_id']] for t in chosen_teams)}")
         st.markdown(f"**Title:** {title}")
+        st.markdown(f"**Body:** {len(body_raw):,} characters")
         st.markdown(f"**Sentiment:** {sentiment}")
         st.markdown(f"**Mode:** {'🗒️ Draft' if is_draft else '🚀 Publish immediately'}")
 
@@ -236,6 +440,8 @@ publish_btn = st.button(
 )
 
 if publish_btn and ready:
+    body_stripped = body_raw.strip()
+    body = body_stripped if "<" in body_stripped else f"<p>{body_stripped}</p>"
     article = {
         "title":     title.strip(),
         "subtitle":  subtitle.strip(),
@@ -246,31 +452,74 @@ if publish_btn and ready:
     persona_hash = chosen_persona["system_info"]["hash"]
     team_ids     = [t["team_id"] for t in chosen_teams]
 
-    results = []
+    # Every team gets the same message; only team_id differs per request
+    base_payload = {
+        "persona":   persona_hash,
+        "channel":   "websites",
+        "title":     article["title"],
+        "subtitle":  article["subtitle"],
+        "body":      article["body"],
+        "assets":    [],
+        "sentiment": article["sentiment"],
+        "type":      "team",
+        "isDraft":   article["is_draft"],
+    }
+
+    payloads = [base_payload | {"team_id": team_id} for team_id in team_ids]
+
     progress = st.progress(0, text="Publishing…")
 
-    for i, team_id in enumerate(team_ids):
-        payload = {
-            "persona":   persona_hash,
-            "channel":   "websites",
-            "title":     article["title"],
-            "subtitle":  article["subtitle"],
-            "body":      article["body"],
-            "assets":    [],
-            "sentiment": article["sentiment"],
-            "team_id":   team_id,
-            "type":      "team",
-            "isDraft":   article["is_draft"],
-        }
-        result = publish_to_team(api_key, payload)
-        results.append({"team_id": team_id, **result})
-        progress.progress((i + 1) / len(team_ids), text=f"Published {i + 1} of {len(team_ids)}…")
-        if i < len(team_ids) - 1:
-            time.sleep(0.5)
+    bulk_result = publish_bulk(api_key, payloads) if len(payloads) > 1 else None
+    if bulk_result is not None:
+        results_by_team = {team_id: {"team_id": team_id, **bulk_result} for team_id in team_ids}
+    else:
+        results_by_team = {}
+        cancelled = threading.Event()
+        executor  = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS)
+        try:
+            # Pace inside the workers so every future is queued up front and
+            # progress updates start with the first completed request
+            start = time.monotonic()
+            futures = {
+                executor.submit(publish_to_team_at, api_key, payload, start + i * PUBLISH_INTERVAL, cancelled): team_id
+                for i, (team_id, payload) in enumerate(zip(team_ids, payloads))
+            }
+
+            # Each progress update is a websocket round-trip; cap them at ~50 total
+            step = max(1, len(team_ids) // 50)
+            for done, future in enumerate(as_completed(futures), start=1):
+                team_id = futures[future]
+                results_by_team[team_id] = {"team_id": team_id, **future.result()}
+                if done % step == 0 or done == len(team_ids):
+                    progress.progress(done / len(team_ids), text=f"Published {done} of {len(team_ids)}…")
+        except BaseException:
+            # Interrupted (e.g. Streamlit's rerun exception when a widget is
+            # touched): stop sending the remaining messages, and keep what was
+            # already published visible so it isn't published again by accident
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            st.session_state["last_results"] = [
+                results_by_team[team_id] for team_id in team_ids if team_id in results_by_team
+            ]
+            st.session_state["last_results_teams"] = team_name_by_id
+            raise
+        executor.shutdown()
+
+    # Keep results in the order the teams were chosen
+    results = [results_by_team[team_id] for team_id in team_ids]
 
     progress.empty()
 
-    # Results
+    # Persist so the results survive later reruns without re-publishing
+    st.session_state["last_results"]       = results
+    st.session_state["last_results_teams"] = team_name_by_id
+
+# ── Results ────────────────────────────────────────────────────────────────────
+
+results = st.session_state.get("last_results")
+if results:
+    results_team_names = st.session_state["last_results_teams"]
+
     st.divider()
     st.subheader("Results")
     successes = [r for r in results if r["ok"]]
@@ -282,15 +531,14 @@ if publish_btn and ready:
         st.error(f"✗ {len(failures)} publish(es) failed.")
 
     for r in results:
-        team_name = next(
-            (clean_team_name(t["name"]) for t in teams if t["team_id"] == r["team_id"]),
-            str(r["team_id"]),
-        )
+        team_name = results_team_names.get(r["team_id"], str(r["team_id"]))
         if r["ok"]:
             st.markdown(f"✅ **{team_name}** — HTTP {r['status']}")
         else:
             st.markdown(f"❌ **{team_name}** — HTTP {r['status']}: `{r.get('error', 'unknown error')}`")
 
+    st.button("Clear results", on_click=clear_results)
+
 # ── Footer ─────────────────────────────────────────────────────────────────────
 
 st.divider()
@@ -299,10 +547,18 @@ with col1:
     st.caption(f"Connected to `{API_BASE}`")
 with col2:
     if st.button("🔄 Refresh data"):
-        fetch_personas.clear()
-        fetch_teams.clear()
+        fetch_personas.clear(api_key)
+        fetch_teams.clear(api_key)
+        _clear_etag_cache(api_key)
         st.session_state.pop("orgs", None)
         st.session_state.pop("teams", None)
+        st.session_state.pop("team_name_by_id", None)
+        st.session_state.pop("persona_options", None)
+        st.session_state.pop("team_options", None)
+        st.session_state.pop("persona_option_labels", None)
+        st.session_state.pop("team_option_labels", None)
+        st.session_state.pop("team_multiselect", None)
+        clear_results()
         st.session_state.pop("api_key", None)
         st.rerun()
 